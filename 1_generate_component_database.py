@@ -7,6 +7,7 @@ import time
 # --- Configuration ---
 NUM_ROWS_TO_GENERATE = 50000
 MAX_GENERATION_ATTEMPTS_PER_COMPOUND = 100
+RANDOM_SEED = 42 # Fixed seed so reruns with the same config are reproducible (and cacheable)
 
 # --- Seed Data (initial known compounds) ---
 SEED_DATA = {
@@ -181,6 +182,8 @@ def generate_pure_component_data(num_rows):
 # --- Main Execution ---
 if __name__ == "__main__":
     start_time = time.time()
+    random.seed(RANDOM_SEED)
+    np.random.seed(RANDOM_SEED)
     print(f"Generating {NUM_ROWS_TO_GENERATE} synthetic pure component entries...")
 
     data = generate_pure_component_data(NUM_ROWS_TO_GENERATE)
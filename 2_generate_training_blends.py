@@ -1,28 +1,75 @@
+import argparse
 import csv
 import random
 import numpy as np
 import pandas as pd
 import time
+import warnings
+from scipy.stats import qmc
+from sklearn.compose import ColumnTransformer, TransformedTargetRegressor
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.neural_network import MLPRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
 
 # --- Configuration ---
 NUM_GASOLINE_BLENDS = 50000
 NUM_DIESEL_BLENDS = 50000
-INPUT_DATABASE_FILE = 'pure_components_synthetic_data_v4.csv' 
-OUTPUT_FILE = 'fuel_blends_training_data_v3.csv' 
+INPUT_DATABASE_FILE = 'pure_components_synthetic_data_v4.csv'
+OUTPUT_FILE = 'fuel_blends_training_data_v3.csv'
+RANDOM_SEED = 42 # Fixed seed so reruns with the same config are reproducible (and cacheable)
 
-def generate_blends():
-    # --- Load the Component Database ---
+# --- Sampling Configuration ---
+# 'uniform'    : independent random component picks and percentages (original behaviour)
+# 'stratified' : every base/additive pair is covered evenly; when there are more pairs than rows, every
+#                (base property bin, additive property bin) cell of a STRATIFIED_BINS x STRATIFIED_BINS grid is
+#                covered evenly instead, along with evenly stratified additive percentages
+# 'sobol'/'lhs': low-discrepancy points over (base property, additive property, additive %)
+# 'active'     : a space-filling seed batch, then batches placed where the surrogate model disagrees most with the blending rules
+SAMPLING_STRATEGY = 'uniform'
+STRATIFIED_BINS = 10                   # Property bins per axis for 'stratified' pair coverage
+ACTIVE_LEARNING_INITIAL_FRACTION = 0.2 # Share of the row budget used for the space-filling seed batch
+ACTIVE_LEARNING_BATCHES = 4            # Number of model-guided batches after the seed batch
+ACTIVE_LEARNING_POOL_FACTOR = 5        # Candidates scored per row that is kept
+ACTIVE_LEARNING_MIN_SEED_ROWS = 50     # Smallest seed batch the surrogate is fitted on
+SURROGATE_EARLY_STOPPING_MIN_ROWS = 50 # Below this, the surrogate trains without a validation split
+
+# --- Sampling Report Configuration (python 2_generate_training_blends.py --report) ---
+REPORT_STRATEGIES = ['uniform', 'stratified', 'sobol', 'lhs', 'active']
+REPORT_ROW_BUDGETS = [1000, 2500, 5000, 10000]
+REPORT_TEST_ROWS = 5000
+
+# --- Blend Definitions ---
+# 'order_by' is the property used to lay out the base and additive pools along one axis each,
+# so low-discrepancy points spread over property space rather than over name order.
+BLEND_SPECS = {
+    'gasoline': {
+        'additive_pct_range': (0.5, 40.0),
+        'order_by': ('RON', 'RON'),
+        'targets': ['RON', 'MON', 'AKI', 'LHV', 'Density', 'O2_wt_percent',
+                    'Oxidative_Stability', 'Gum_Content', 'Acidity'],
+    },
+    'diesel': {
+        'additive_pct_range': (0.5, 25.0),
+        'order_by': ('CN', 'CN'),
+        'targets': ['CN', 'LHV', 'Density', 'O2_wt_percent',
+                    'Oxidative_Stability', 'Gum_Content', 'Acidity'],
+    },
+}
+
+def load_component_categories():
+    """Loads the component database and splits it into (base, additive) pools per fuel type."""
     print(f"Loading component database from '{INPUT_DATABASE_FILE}'...")
     try:
         # Drop rows where critical properties are missing for blending
         df_components = pd.read_csv(INPUT_DATABASE_FILE).dropna(
-            subset=['RON', 'MON', 'CN', 'Density', 'LHV', 'O2_wt_percent', 
-                    'Oxidative_Stability', 'Gum_Content', 'Acidity'] 
+            subset=['RON', 'MON', 'CN', 'Density', 'LHV', 'O2_wt_percent',
+                    'Oxidative_Stability', 'Gum_Content', 'Acidity']
         )
     except FileNotFoundError:
         print(f"ERROR: Database file '{INPUT_DATABASE_FILE}' not found.")
         print("Please run '1_generate_component_database.py' first.")
-        return
+        return None
 
     # --- Filtering ---
     print("Filtering components into fuel categories...")
@@ -42,20 +89,16 @@ def generate_blends():
 
     if any(df.empty for df in [BASE_GASOLINES_DF, OXYGENATES_DF, DIESEL_BASE_DF, DIESEL_ADDITIVES_DF]):
         print("ERROR: One or more component categories are empty after filtering.")
-        return
-        
+        return None
+
     print(f"Found {len(BASE_GASOLINES_DF)} base gasolines, {len(OXYGENATES_DF)} oxygenates, {len(DIESEL_BASE_DF)} diesel components.")
+    return {
+        'gasoline': (BASE_GASOLINES_DF, OXYGENATES_DF),
+        'diesel': (DIESEL_BASE_DF, DIESEL_ADDITIVES_DF),
+    }
 
-    # --- Vectorized Gasoline Blend Generation ---
-    print(f"\nGenerating {NUM_GASOLINE_BLENDS} gasoline blends (vectorized)...")
-    
-    base_indices = np.random.randint(0, len(BASE_GASOLINES_DF), size=NUM_GASOLINE_BLENDS)
-    oxy_indices = np.random.randint(0, len(OXYGENATES_DF), size=NUM_GASOLINE_BLENDS)
-    
-    base_props_df = BASE_GASOLINES_DF.iloc[base_indices].reset_index(drop=True)
-    oxy_props_df = OXYGENATES_DF.iloc[oxy_indices].reset_index(drop=True)
-
-    additive_pct = np.random.uniform(0.5, 40.0, size=NUM_GASOLINE_BLENDS)
+# --- Blending Rules ---
+def blend_gasoline(base_props_df, oxy_props_df, additive_pct):
     vf_oxy = additive_pct / 100.0
     vf_base = 1.0 - vf_oxy
 
@@ -63,11 +106,11 @@ def generate_blends():
     # Existing properties
     ron = base_props_df['RON'].values + ((oxy_props_df['RON'].values - base_props_df['RON'].values) * (vf_oxy**0.85))
     mon = base_props_df['MON'].values + ((oxy_props_df['MON'].values - base_props_df['MON'].values) * (vf_oxy**0.95))
-    
+
     mass_base = vf_base * base_props_df['Density'].values
     mass_oxy = vf_oxy * oxy_props_df['Density'].values
     total_mass = mass_base + mass_oxy
-    
+
     density = base_props_df['Density'].values * vf_base + oxy_props_df['Density'].values * vf_oxy
     lhv = (mass_base * base_props_df['LHV'].values + mass_oxy * oxy_props_df['LHV'].values) / total_mass
     o2_wt = (mass_base * base_props_df['O2_wt_percent'].values + mass_oxy * oxy_props_df['O2_wt_percent'].values) / total_mass
@@ -79,7 +122,7 @@ def generate_blends():
     acidity = base_props_df['Acidity'].values * vf_base + oxy_props_df['Acidity'].values * vf_oxy
 
     # --- Assemble the final DataFrame with ALL columns ---
-    gasoline_df = pd.DataFrame({
+    return pd.DataFrame({
         'fuel_type': 'gasoline',
         'component_1': base_props_df['name'],
         'component_1_vol_pct': 100.0 - additive_pct,
@@ -90,25 +133,16 @@ def generate_blends():
         'Oxidative_Stability': stability, 'Gum_Content': gum, 'Acidity': acidity # <-- ADDED HERE
     })
 
-    # --- Vectorized Diesel Blend Generation ---
-    print(f"Generating {NUM_DIESEL_BLENDS} diesel blends (vectorized)...")
-    
-    base_indices = np.random.randint(0, len(DIESEL_BASE_DF), size=NUM_DIESEL_BLENDS)
-    additive_indices = np.random.randint(0, len(DIESEL_ADDITIVES_DF), size=NUM_DIESEL_BLENDS)
-    
-    base_props_df = DIESEL_BASE_DF.iloc[base_indices].reset_index(drop=True)
-    additive_props_df = DIESEL_ADDITIVES_DF.iloc[additive_indices].reset_index(drop=True)
-    
-    additive_pct = np.random.uniform(0.5, 25.0, size=NUM_DIESEL_BLENDS)
+def blend_diesel(base_props_df, additive_props_df, additive_pct):
     vf_additive = additive_pct / 100.0
     vf_base = 1.0 - vf_additive
-    
+
     cn = base_props_df['CN'].values - ((base_props_df['CN'].values - additive_props_df['CN'].values) * (vf_additive**1.2))
-    
+
     mass_base = vf_base * base_props_df['Density'].values
     mass_add = vf_additive * additive_props_df['Density'].values
     total_mass = mass_base + mass_add
-    
+
     density = base_props_df['Density'].values * vf_base + additive_props_df['Density'].values * vf_additive
     lhv = (mass_base * base_props_df['LHV'].values + mass_add * additive_props_df['LHV'].values) / total_mass
     o2_wt = (mass_base * base_props_df['O2_wt_percent'].values + mass_add * additive_props_df['O2_wt_percent'].values) / total_mass
@@ -118,7 +152,7 @@ def generate_blends():
     gum = base_props_df['Gum_Content'].values * vf_base + additive_props_df['Gum_Content'].values * vf_additive
     acidity = base_props_df['Acidity'].values * vf_base + additive_props_df['Acidity'].values * vf_additive
 
-    diesel_df = pd.DataFrame({
+    return pd.DataFrame({
         'fuel_type': 'diesel',
         'component_1': base_props_df['name'],
         'component_1_vol_pct': 100.0 - additive_pct,
@@ -128,14 +162,157 @@ def generate_blends():
         'Oxidative_Stability': stability, 'Gum_Content': gum, 'Acidity': acidity # <-- ADDED HERE
     })
 
+BLEND_FUNCTIONS = {'gasoline': blend_gasoline, 'diesel': blend_diesel}
+
+# --- Sampling Strategies ---
+def _balanced_indices(n_items, n_rows):
+    """Cycles through shuffled permutations so every index appears n_rows/n_items times (+/- 1)."""
+    reps = -(-n_rows // n_items)
+    return np.argsort(np.random.rand(reps, n_items), axis=1).ravel()[:n_rows]
+
+def _unit_to_index(u, order):
+    """Maps points in [0, 1) onto positions of a property-sorted index array."""
+    return order[np.minimum((u * len(order)).astype(int), len(order) - 1)]
+
+def _binned_indices(bins, u, order):
+    """Picks, for each row, the position u in [0, 1) within its property bin of 'order'."""
+    edges = np.linspace(0, len(order), STRATIFIED_BINS + 1).astype(int)
+    starts, sizes = edges[bins], np.maximum(edges[bins + 1] - edges[bins], 1)
+    return order[np.minimum(starts + (u * sizes).astype(int), len(order) - 1)]
+
+def sample_blend_points(n_rows, base_df, additive_df, spec, strategy):
+    """Returns (base_indices, additive_indices, additive_pct) for 'n_rows' blends."""
+    n_base, n_add = len(base_df), len(additive_df)
+    pct_min, pct_max = spec['additive_pct_range']
+
+    if strategy not in ('uniform', 'stratified', 'sobol', 'lhs'):
+        raise ValueError(f"Unknown sampling strategy '{strategy}'.")
+    if n_rows == 0:
+        return np.array([], dtype=int), np.array([], dtype=int), np.array([], dtype=float)
+
+    if strategy == 'uniform':
+        base_indices = np.random.randint(0, n_base, size=n_rows)
+        additive_indices = np.random.randint(0, n_add, size=n_rows)
+        additive_pct = np.random.uniform(pct_min, pct_max, size=n_rows)
+
+    elif strategy == 'stratified':
+        if n_base * n_add <= n_rows:
+            # Enough rows to cover every pair: cycle through the full pair grid.
+            pair_indices = _balanced_indices(n_base * n_add, n_rows)
+            base_indices, additive_indices = pair_indices // n_add, pair_indices % n_add
+        else:
+            # Too many pairs to enumerate: cover every (base bin, additive bin) cell of the
+            # property grid evenly, so rare property combinations get the same share as common ones.
+            base_key, additive_key = spec['order_by']
+            base_order = np.argsort(base_df[base_key].values, kind='stable')
+            additive_order = np.argsort(additive_df[additive_key].values, kind='stable')
+            cell_indices = _balanced_indices(STRATIFIED_BINS * STRATIFIED_BINS, n_rows)
+            base_indices = _binned_indices(cell_indices // STRATIFIED_BINS, np.random.uniform(size=n_rows), base_order)
+            additive_indices = _binned_indices(cell_indices % STRATIFIED_BINS, np.random.uniform(size=n_rows), additive_order)
+        # One percentage per equal-width stratum, in shuffled order.
+        strata = (np.random.permutation(n_rows) + np.random.uniform(size=n_rows)) / n_rows
+        additive_pct = pct_min + (pct_max - pct_min) * strata
+
+    else:
+        seed = np.random.randint(0, 2**31 - 1)
+        if strategy == 'sobol':
+            m = max(0, int(np.ceil(np.log2(n_rows))))
+            points = qmc.Sobol(d=3, scramble=True, seed=seed).random_base2(m)[:n_rows]
+        else:
+            points = qmc.LatinHypercube(d=3, seed=seed).random(n_rows)
+        base_key, additive_key = spec['order_by']
+        base_order = np.argsort(base_df[base_key].values, kind='stable')
+        additive_order = np.argsort(additive_df[additive_key].values, kind='stable')
+        base_indices = _unit_to_index(points[:, 0], base_order)
+        additive_indices = _unit_to_index(points[:, 1], additive_order)
+        additive_pct = pct_min + (pct_max - pct_min) * points[:, 2]
+
+    return base_indices, additive_indices, additive_pct
+
+def _blend_from_points(fuel_type, base_df, additive_df, points):
+    base_indices, additive_indices, additive_pct = points
+    base_props_df = base_df.iloc[base_indices].reset_index(drop=True)
+    additive_props_df = additive_df.iloc[additive_indices].reset_index(drop=True)
+    return BLEND_FUNCTIONS[fuel_type](base_props_df, additive_props_df, additive_pct)
+
+# --- Surrogate Model (used by active learning and the sampling report) ---
+def fit_surrogate(blend_df, targets):
+    """
+    Fits a small MLP on the same inputs as the production model (component names one-hot
+    encoded, percentages scaled). It is a cheap stand-in for the Keras model trained in
+    '3_train_ai_models.py', good enough to rank where the model is still wrong.
+    """
+    preprocessor = ColumnTransformer([
+        ('numerical', StandardScaler(), ['component_1_vol_pct', 'component_2_vol_pct']),
+        ('categorical', OneHotEncoder(handle_unknown='ignore'), ['component_1', 'component_2']),
+    ])
+    # Early stopping holds out 10% for validation, which needs a minimum number of rows.
+    regressor = MLPRegressor(hidden_layer_sizes=(64,), max_iter=200,
+                             early_stopping=len(blend_df) >= SURROGATE_EARLY_STOPPING_MIN_ROWS,
+                             random_state=RANDOM_SEED)
+    model = make_pipeline(preprocessor, TransformedTargetRegressor(regressor=regressor, transformer=StandardScaler()))
+    with warnings.catch_warnings():
+        # A few non-converged iterations are fine for a ranking model.
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        model.fit(blend_df, blend_df[targets].values)
+    return model
+
+def generate_active_learning(fuel_type, n_rows, base_df, additive_df, spec):
+    """Grows the dataset batch by batch, keeping the candidates the surrogate predicts worst."""
+    targets = spec['targets']
+    n_initial = min(n_rows, max(ACTIVE_LEARNING_MIN_SEED_ROWS, int(n_rows * ACTIVE_LEARNING_INITIAL_FRACTION)))
+    blend_df = _blend_from_points(fuel_type, base_df, additive_df,
+                                  sample_blend_points(n_initial, base_df, additive_df, spec, 'sobol'))
+    batch_size = max(1, -(-(n_rows - n_initial) // ACTIVE_LEARNING_BATCHES))
+
+    while len(blend_df) < n_rows:
+        n_batch = min(batch_size, n_rows - len(blend_df))
+        model = fit_surrogate(blend_df, targets)
+
+        candidates_df = _blend_from_points(fuel_type, base_df, additive_df,
+                                           sample_blend_points(n_batch * ACTIVE_LEARNING_POOL_FACTOR,
+                                                               base_df, additive_df, spec, 'lhs'))
+        # The blending rules give the exact answer for free, so the error is measured, not estimated.
+        scale = blend_df[targets].values.std(axis=0)
+        scale[scale == 0] = 1.0
+        errors = (np.abs(model.predict(candidates_df) - candidates_df[targets].values) / scale).mean(axis=1)
+
+        chosen = np.argsort(errors)[-n_batch:]
+        blend_df = pd.concat([blend_df, candidates_df.iloc[chosen]], ignore_index=True)
+        print(f"  Active learning: {len(blend_df)}/{n_rows} rows (batch mean scaled error {errors[chosen].mean():.3f})")
+
+    return blend_df
+
+def generate_fuel_blends(fuel_type, n_rows, categories, strategy=SAMPLING_STRATEGY):
+    base_df, additive_df = categories[fuel_type]
+    spec = BLEND_SPECS[fuel_type]
+    if strategy == 'active':
+        return generate_active_learning(fuel_type, n_rows, base_df, additive_df, spec)
+    return _blend_from_points(fuel_type, base_df, additive_df,
+                              sample_blend_points(n_rows, base_df, additive_df, spec, strategy))
+
+def generate_blends():
+    # --- Load the Component Database ---
+    categories = load_component_categories()
+    if categories is None:
+        return
+
+    # --- Vectorized Gasoline Blend Generation ---
+    print(f"\nGenerating {NUM_GASOLINE_BLENDS} gasoline blends ('{SAMPLING_STRATEGY}' sampling)...")
+    gasoline_df = generate_fuel_blends('gasoline', NUM_GASOLINE_BLENDS, categories)
+
+    # --- Vectorized Diesel Blend Generation ---
+    print(f"Generating {NUM_DIESEL_BLENDS} diesel blends ('{SAMPLING_STRATEGY}' sampling)...")
+    diesel_df = generate_fuel_blends('diesel', NUM_DIESEL_BLENDS, categories)
+
     # --- Combine, Shuffle, and Save ---
     print("\nCombining and shuffling final dataset...")
     final_df = pd.concat([gasoline_df, diesel_df], ignore_index=True)
     final_df = final_df.sample(frac=1).reset_index(drop=True)
-    
+
     # --- UPDATE the header and rounding lists ---
     numeric_cols = [
-        'component_1_vol_pct', 'component_2_vol_pct', 'RON', 'MON', 'AKI', 'CN', 
+        'component_1_vol_pct', 'component_2_vol_pct', 'RON', 'MON', 'AKI', 'CN',
         'LHV', 'Density', 'O2_wt_percent', 'Oxidative_Stability', 'Gum_Content', 'Acidity'
     ]
     for col in numeric_cols:
@@ -147,14 +324,52 @@ def generate_blends():
         'RON', 'MON', 'AKI', 'CN', 'LHV', 'Density', 'O2_wt_percent',
         'Oxidative_Stability', 'Gum_Content', 'Acidity' # <-- ADDED HERE
     ]
-    
+
     print(f"Saving {len(final_df)} total blends to '{OUTPUT_FILE}'...")
     final_df.to_csv(OUTPUT_FILE, index=False, columns=header) # Use the header to ensure order
 
     print("Success! Master training data file created.")
 
+def sampling_report():
+    """
+    Prints the test MAE the surrogate model reaches for each sampling strategy and row budget,
+    measured on a fixed, uniformly sampled test set labelled by the blending rules.
+    """
+    categories = load_component_categories()
+    if categories is None:
+        return
+
+    for fuel_type, spec in BLEND_SPECS.items():
+        targets = spec['targets']
+        np.random.seed(RANDOM_SEED + 1)
+        test_df = generate_fuel_blends(fuel_type, REPORT_TEST_ROWS, categories, strategy='uniform')
+
+        print(f"\n{'='*20} SAMPLING REPORT: {fuel_type.upper()} {'='*20}")
+        print(f"{'strategy':<12}" + ''.join(f"{n:>12}" for n in REPORT_ROW_BUDGETS) + f"{'time (s)':>12}")
+        for strategy in REPORT_STRATEGIES:
+            maes = []
+            start_time = time.time()
+            for n_rows in REPORT_ROW_BUDGETS:
+                np.random.seed(RANDOM_SEED)
+                train_df = generate_fuel_blends(fuel_type, n_rows, categories, strategy=strategy)
+                model = fit_surrogate(train_df, targets)
+                maes.append(np.abs(model.predict(test_df) - test_df[targets].values).mean())
+            elapsed = time.time() - start_time
+            print(f"{strategy:<12}" + ''.join(f"{mae:>12.4f}" for mae in maes) + f"{elapsed:>12.1f}")
+
+    print("\nColumns are rows generated; values are surrogate test MAE (mean over all targets, as reported by '3_train_ai_models.py').")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the fuel blend training dataset.")
+    parser.add_argument('--report', action='store_true',
+                        help="Compare sampling strategies (accuracy per rows generated) instead of writing the dataset.")
+    args = parser.parse_args()
+
     start_time = time.time()
-    generate_blends()
+    np.random.seed(RANDOM_SEED)
+    if args.report:
+        sampling_report()
+    else:
+        generate_blends()
     end_time = time.time()
-    print(f"\nTotal generation time: {end_time - start_time:.2f} seconds.")
\ No newline at end of file
+    print(f"\nTotal generation time: {end_time - start_time:.2f} seconds.")
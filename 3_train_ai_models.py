@@ -1,4 +1,5 @@
 import pandas as pd
+import sklearn
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
@@ -8,13 +9,32 @@ from tensorflow.keras import layers
 import joblib
 import os
 import time
-from scipy.sparse import hstack
+import glob
+import hashlib
+import inspect
+import json
+import tempfile
+import numpy as np
+from scipy.sparse import hstack, save_npz, load_npz
 
 # --- Configuration ---
 DATA_FILE = 'fuel_blends_training_data_v3.csv'
 MODEL_DIR = 'models'
 EPOCHS = 50
 BATCH_SIZE = 32
+TEST_SIZE = 0.2
+RANDOM_SEED = 42
+PREPROCESS_CACHE_DIR = os.path.join('.pipeline_cache', 'preprocessed')
+# Set by 'run_pipeline.py --force' (or by hand) to rebuild the matrices instead of loading them
+IGNORE_PREPROCESS_CACHE = os.environ.get('FUELAI_IGNORE_PREPROCESS_CACHE') == '1'
+
+# --- Compact Model Tiers (distilled student + quantized variants for CPU serving) ---
+BUILD_COMPACT_TIERS = True
+STUDENT_LAYERS = [32, 16]
+DISTILL_EPOCHS = 30
+QUANTIZATION_MODES = ['float16', 'int8'] # Written as TFLite flatbuffers; int8 = dynamic-range weight quantization
+TIER_EVAL_ROWS = 2000    # Test rows used to measure each tier's MAE
+TIER_LATENCY_RUNS = 100  # Single-row predictions timed per tier (median is reported)
 
 # --- GPU Check and Setup ---
 print("TensorFlow Version:", tf.__version__)
@@ -32,6 +52,7 @@ else:
     print("No GPU found. Training will use CPU.")
 
 os.makedirs(MODEL_DIR, exist_ok=True)
+tf.keras.utils.set_random_seed(RANDOM_SEED)
 
 # --- Load and Prepare Data ---
 print(f"Loading master data from '{DATA_FILE}'...")
@@ -42,17 +63,38 @@ df_diesel = df[df['fuel_type'] == 'diesel'].drop(columns=['fuel_type', 'RON', 'M
 
 print(f"Loaded {len(df_gasoline)} gasoline blends and {len(df_diesel)} diesel blends.")
 
-# --- Reusable Model Training Function ---
-def train_fuel_model(df_data, target_cols, model_name):
-    print(f"\n{'='*20} TRAINING MODEL: {model_name.upper()} {'='*20}")
-    
+# --- Cached Preprocessing ---
+def preprocess_fuel_data(df_data, target_cols, model_name):
+    """
+    Splits and encodes the data for one model. The resulting matrices are cached on disk,
+    keyed by a hash of the input rows, split settings, this function's source and the
+    scikit-learn version, so re-training with a different EPOCHS/BATCH_SIZE skips the (slow)
+    one-hot encoding of the wide component columns.
+    """
+    key_hash = hashlib.sha256()
+    key_hash.update(pd.util.hash_pandas_object(df_data, index=True).values.tobytes())
+    key_hash.update(repr((list(df_data.columns), list(target_cols), TEST_SIZE, RANDOM_SEED)).encode('utf-8'))
+    key_hash.update(inspect.getsource(preprocess_fuel_data).encode('utf-8'))
+    key_hash.update(sklearn.__version__.encode('utf-8'))
+    cache_path = os.path.join(PREPROCESS_CACHE_DIR, f'{model_name}_{key_hash.hexdigest()[:16]}')
+
+    if not IGNORE_PREPROCESS_CACHE and os.path.exists(os.path.join(cache_path, 'preprocessor.joblib')):
+        print(f"Loading cached preprocessed matrices from '{cache_path}'...")
+        return (
+            load_npz(os.path.join(cache_path, 'X_train.npz')),
+            load_npz(os.path.join(cache_path, 'X_test.npz')),
+            np.load(os.path.join(cache_path, 'y_train.npy')),
+            np.load(os.path.join(cache_path, 'y_test.npy')),
+            joblib.load(os.path.join(cache_path, 'preprocessor.joblib')),
+        )
+
     X = df_data.drop(columns=target_cols)
     y = df_data[target_cols]
     
     categorical_features = X.select_dtypes(include=['object']).columns
     numerical_features = X.select_dtypes(include=['number']).columns
     
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_SEED)
 
     num_preprocessor = StandardScaler()
     X_train_num = num_preprocessor.fit_transform(X_train[numerical_features])
@@ -64,10 +106,174 @@ def train_fuel_model(df_data, target_cols, model_name):
 
     X_train_processed_sparse = hstack([X_train_num, X_train_cat_sparse]).tocsr()
     X_test_processed_sparse = hstack([X_test_num, X_test_cat_sparse]).tocsr()
-    
-    print(f"Processed data shape: {X_train_processed_sparse.shape}")
 
     preprocessor = {'numerical': num_preprocessor, 'categorical': cat_preprocessor}
+
+    # Write the preprocessor last: its presence marks the cache entry as complete.
+    os.makedirs(cache_path, exist_ok=True)
+    save_npz(os.path.join(cache_path, 'X_train.npz'), X_train_processed_sparse)
+    save_npz(os.path.join(cache_path, 'X_test.npz'), X_test_processed_sparse)
+    np.save(os.path.join(cache_path, 'y_train.npy'), y_train.values)
+    np.save(os.path.join(cache_path, 'y_test.npy'), y_test.values)
+    joblib.dump(preprocessor, os.path.join(cache_path, 'preprocessor.joblib'))
+    print(f"Cached preprocessed matrices to '{cache_path}'")
+
+    return X_train_processed_sparse, X_test_processed_sparse, y_train.values, y_test.values, preprocessor
+
+# --- Compact Model Tiers ---
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def remove_tier_artifacts(model_name):
+    """Deletes compact tiers left by a previous run, so they never sit next to a new full model."""
+    stale = glob.glob(os.path.join(MODEL_DIR, f'{model_name}_student*')) + \
+            glob.glob(os.path.join(MODEL_DIR, f'{model_name}_tiers.json'))
+    for path in stale:
+        os.remove(path)
+        print(f"Removed stale tier artifact '{path}'")
+
+def make_keras_predictor(model, chunk_rows=256):
+    """
+    Calls the model through a traced tf.function on dense float32 rows, the same path the
+    backend serves with. model.predict() adds tens of ms of fixed overhead per call, which
+    would hide the size difference between tiers.
+    """
+    serve = tf.function(lambda x: model(x, training=False), autograph=False,
+                        input_signature=[tf.TensorSpec([None, model.input_shape[1]], tf.float32)])
+
+    def predict(X):
+        return np.concatenate([
+            serve(X[i:i + chunk_rows].toarray().astype(np.float32)).numpy()
+            for i in range(0, X.shape[0], chunk_rows)
+        ])
+    return predict
+
+def make_tflite_predictor(tflite_model):
+    """Wraps a TFLite flatbuffer in a predict(X_sparse) function, one row per invoke."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        Interpreter = tf.lite.Interpreter
+    interpreter = Interpreter(model_content=tflite_model)
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+
+    def predict(X):
+        outputs = []
+        for i in range(X.shape[0]):
+            interpreter.set_tensor(input_index, X[i].toarray().astype(np.float32))
+            interpreter.invoke()
+            outputs.append(interpreter.get_tensor(output_index)[0].copy())
+        return np.array(outputs)
+    return predict
+
+def convert_to_tflite(model, mode):
+    """Post-training quantization: 'float16' weights, or 'int8' dynamic-range weights."""
+    def configure(converter):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if mode == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        elif mode != 'int8':
+            raise ValueError(f"Unknown quantization mode '{mode}'.")
+        return converter.convert()
+
+    try:
+        return configure(tf.lite.TFLiteConverter.from_keras_model(model))
+    except Exception as e:
+        # from_keras_model is unreliable on some Keras 3 / TF >= 2.16 combinations;
+        # going through an exported SavedModel works on all of them.
+        print(f"from_keras_model failed ({e}); converting via SavedModel export instead.")
+        with tempfile.TemporaryDirectory() as export_dir:
+            model.export(export_dir, verbose=False)
+            return configure(tf.lite.TFLiteConverter.from_saved_model(export_dir))
+
+def measure_tier(predict, X_test, y_test):
+    """Returns (MAE over the first TIER_EVAL_ROWS test rows, median single-row latency in ms)."""
+    n_eval = min(TIER_EVAL_ROWS, X_test.shape[0])
+    mae = float(np.mean(np.abs(predict(X_test[:n_eval]) - y_test[:n_eval])))
+
+    predict(X_test[:1]) # Warm-up call, excluded from timing
+    timings = []
+    for i in range(TIER_LATENCY_RUNS):
+        row = X_test[i % n_eval]
+        start = time.perf_counter()
+        predict(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return mae, float(np.median(timings))
+
+def build_model_tiers(model, model_name, X_train, X_test, y_test):
+    """
+    Distills the full model into a small student network, writes float16/int8 TFLite
+    variants of the student, and records every tier's measured MAE, latency and size in
+    '<model_name>_tiers.json' for the backend to choose from. The file also records the
+    hash of the full model it was built from, so the backend can reject a stale summary.
+    """
+    print(f"\n--- Building compact tiers for {model_name} ---")
+    model_path = os.path.join(MODEL_DIR, f'{model_name}_model.keras')
+    tiers = {}
+
+    def record(tier, path, predict):
+        mae, latency_ms = measure_tier(predict, X_test, y_test)
+        tiers[tier] = {
+            'path': os.path.basename(path),
+            'mae': round(mae, 4),
+            'latency_ms': round(latency_ms, 3),
+            'size_bytes': os.path.getsize(path),
+        }
+        print(f"Tier '{tier}': MAE {mae:.4f}, latency {latency_ms:.2f} ms, size {tiers[tier]['size_bytes'] / 1024:.0f} KiB")
+
+    record('full', model_path, make_keras_predictor(model))
+
+    # --- Distillation: the student learns the teacher's outputs, not the raw labels ---
+    teacher_train = model.predict(X_train, batch_size=1024, verbose=0)
+    student = keras.Sequential(
+        [layers.Input(shape=(X_train.shape[1],))] +
+        [layers.Dense(units, activation='relu') for units in STUDENT_LAYERS] +
+        [layers.Dense(y_test.shape[1])]
+    )
+    student.compile(optimizer=keras.optimizers.Adam(learning_rate=0.001),
+                    loss='mean_squared_error',
+                    metrics=['mean_absolute_error'])
+    student.fit(
+        X_train, teacher_train,
+        batch_size=BATCH_SIZE,
+        epochs=DISTILL_EPOCHS,
+        validation_data=(X_test, y_test),
+        callbacks=[keras.callbacks.EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)],
+        verbose=2
+    )
+    student_path = os.path.join(MODEL_DIR, f'{model_name}_student.keras')
+    student.save(student_path)
+    record('student', student_path, make_keras_predictor(student))
+
+    # --- Post-training quantization of the student ---
+    for mode in QUANTIZATION_MODES:
+        tflite_model = convert_to_tflite(student, mode)
+        tflite_path = os.path.join(MODEL_DIR, f'{model_name}_student_{mode}.tflite')
+        with open(tflite_path, 'wb') as f:
+            f.write(tflite_model)
+        record(f'student_{mode}', tflite_path, make_tflite_predictor(tflite_model))
+
+    tiers_path = os.path.join(MODEL_DIR, f'{model_name}_tiers.json')
+    with open(tiers_path, 'w', encoding='utf-8') as f:
+        json.dump({'teacher_sha256': file_sha256(model_path), 'tiers': tiers}, f, indent=2)
+    print(f"Successfully saved tier summary to '{tiers_path}'")
+
+# --- Reusable Model Training Function ---
+def train_fuel_model(df_data, target_cols, model_name):
+    print(f"\n{'='*20} TRAINING MODEL: {model_name.upper()} {'='*20}")
+    remove_tier_artifacts(model_name)
+    
+    X_train_processed_sparse, X_test_processed_sparse, y_train, y_test, preprocessor = preprocess_fuel_data(
+        df_data, target_cols, model_name
+    )
+    
+    print(f"Processed data shape: {X_train_processed_sparse.shape}")
     
     model = keras.Sequential([
         layers.Input(shape=(X_train_processed_sparse.shape[1],)),
@@ -88,16 +294,16 @@ def train_fuel_model(df_data, target_cols, model_name):
     early_stopping = keras.callbacks.EarlyStopping(monitor='val_loss', patience=20, restore_best_weights=True)
     
     history = model.fit(
-        X_train_processed_sparse, y_train.values,
+        X_train_processed_sparse, y_train,
         batch_size=BATCH_SIZE,
         epochs=EPOCHS,
-        validation_data=(X_test_processed_sparse, y_test.values),
+        validation_data=(X_test_processed_sparse, y_test),
         callbacks=[early_stopping],
         verbose=1
     )
     
     print("\nEvaluating model on test data...")
-    loss, mae = model.evaluate(X_test_processed_sparse, y_test.values, verbose=0) # <--- Also use .values here for consistency
+    loss, mae = model.evaluate(X_test_processed_sparse, y_test, verbose=0)
     print(f"Test Set Mean Absolute Error: {mae:.4f}")
     
     preprocessor_path = os.path.join(MODEL_DIR, f'{model_name}_preprocessor.joblib')
@@ -107,6 +313,9 @@ def train_fuel_model(df_data, target_cols, model_name):
     print(f"Successfully saved preprocessor to '{preprocessor_path}'")
     print(f"Successfully saved model to '{model_path}'")
 
+    if BUILD_COMPACT_TIERS:
+        build_model_tiers(model, model_name, X_train_processed_sparse, X_test_processed_sparse, y_test)
+
 gasoline_targets = [
     'RON', 'MON', 'AKI', 'LHV', 'Density', 'O2_wt_percent',
     'Oxidative_Stability', 'Gum_Content', 'Acidity'
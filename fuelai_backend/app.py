@@ -1,12 +1,14 @@
 # fuelai_backend/app.py (Complete, Final Version)
 
 import time
+import json
+import hashlib
+import threading
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
 import joblib
-import tensorflow as tf
 import os
 from scipy.sparse import hstack
 
@@ -19,13 +21,93 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_DIR = os.path.join(BASE_DIR, 'models')
 COMPONENT_DATABASE = os.path.join(BASE_DIR, 'pure_components_synthetic_data_v4.csv')
 
+# --- Model Tiers ---
+# '3_train_ai_models.py' writes '<fuel>_tiers.json' describing the full model and its compact
+# (distilled / quantized) variants. A deployment picks its default tier and which tiers to load
+# (only loaded tiers use memory); a request may ask for any loaded tier via 'modelTier'.
+# TensorFlow is only imported when a '.keras' tier is loaded; TFLite tiers run on the
+# lightweight LiteRT interpreter (ai-edge-litert, or tflite-runtime) when it is installed.
+DEFAULT_MODEL_TIER = os.environ.get('FUELAI_MODEL_TIER', 'full')
+LOADED_MODEL_TIERS = os.environ.get('FUELAI_MODEL_TIERS', 'all')
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_tflite_interpreter(path):
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path)
+
+def load_tflite_predictor(path):
+    interpreter = load_tflite_interpreter(path)
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+    lock = threading.Lock() # An interpreter is not safe to invoke from several threads at once
+
+    def predict(X):
+        with lock:
+            interpreter.set_tensor(input_index, X.toarray().astype(np.float32))
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index).copy()
+    return predict
+
+def load_keras_predictor(path):
+    import tensorflow as tf
+    model = tf.keras.models.load_model(path)
+    # A traced call avoids model.predict()'s per-call overhead, which dwarfs the model itself.
+    serve = tf.function(lambda x: model(x, training=False), autograph=False,
+                        input_signature=[tf.TensorSpec([None, model.input_shape[1]], tf.float32)])
+    return lambda X: serve(X.toarray().astype(np.float32)).numpy()
+
+def load_model_tiers(fuel_type):
+    """Returns {tier_name: {'predict': fn, **metrics}} for the configured tiers of a fuel type."""
+    full_model_file = f'{fuel_type}_model.keras'
+    available = {'full': {'path': full_model_file}}
+    tiers_path = os.path.join(MODEL_DIR, f'{fuel_type}_tiers.json')
+    if os.path.exists(tiers_path):
+        with open(tiers_path, 'r', encoding='utf-8') as f:
+            summary = json.load(f)
+        full_model_path = os.path.join(MODEL_DIR, full_model_file)
+        if os.path.exists(full_model_path) and file_sha256(full_model_path) != summary.get('teacher_sha256'):
+            # The compact tiers were distilled from a different full model; their metrics (and
+            # predictions) no longer describe what is deployed, so only the full model is offered.
+            print(f"--- WARNING: '{tiers_path}' was built from a different {fuel_type} model; ignoring its compact tiers. ---")
+        else:
+            available = summary['tiers']
+
+    wanted = set(available) if LOADED_MODEL_TIERS == 'all' else {t.strip() for t in LOADED_MODEL_TIERS.split(',')}
+    wanted.add(DEFAULT_MODEL_TIER)
+
+    tiers = {}
+    for tier in sorted(wanted):
+        if tier not in available:
+            raise ValueError(f"Model tier '{tier}' is not available for {fuel_type} (have: {', '.join(available)}).")
+        path = os.path.join(MODEL_DIR, available[tier]['path'])
+        if path.endswith('.tflite'):
+            predict_fn = load_tflite_predictor(path)
+        else:
+            predict_fn = load_keras_predictor(path)
+        tiers[tier] = dict(available[tier], predict=predict_fn)
+    return tiers
+
 try:
     # --- Models ---
-    gasoline_model = tf.keras.models.load_model(os.path.join(MODEL_DIR, 'gasoline_model.keras'))
+    gasoline_models = load_model_tiers('gasoline')
     gasoline_preprocessor = joblib.load(os.path.join(MODEL_DIR, 'gasoline_preprocessor.joblib'))
-    diesel_model = tf.keras.models.load_model(os.path.join(MODEL_DIR, 'diesel_model.keras'))
+    diesel_models = load_model_tiers('diesel')
     diesel_preprocessor = joblib.load(os.path.join(MODEL_DIR, 'diesel_preprocessor.joblib'))
-    print("--- All models loaded successfully! ---")
+    print(f"--- All models loaded successfully! Tiers: {', '.join(gasoline_models)} (default: {DEFAULT_MODEL_TIER}) ---")
 
     # --- Component Database for UI and Calculations ---
     df_components = pd.read_csv(COMPONENT_DATABASE).set_index('name')
@@ -39,7 +121,7 @@ try:
 
 except Exception as e:
     print(f"--- FATAL ERROR during initialization: {e} ---")
-    gasoline_model = None
+    gasoline_models = None
     df_components = None
 
 # --- Helper function to create data for the Cascader component WITH DETAILS ---
@@ -136,15 +218,30 @@ def get_components():
         'dieselAdditives': cascader_group_components(diesel_additives, df_components)
     })
 
+@app.route('/api/model_tiers', methods=['GET'])
+def get_model_tiers():
+    if not gasoline_models:
+        return jsonify({'error': 'Models are not loaded on the server.'}), 500
+
+    def describe(tiers):
+        return {name: {k: v for k, v in tier.items() if k not in ('predict', 'path')} for name, tier in tiers.items()}
+
+    return jsonify({
+        'default': DEFAULT_MODEL_TIER,
+        'gasoline': describe(gasoline_models),
+        'diesel': describe(diesel_models)
+    })
+
 @app.route('/api/predict', methods=['POST'])
 def predict():
-    if not gasoline_model:
+    if not gasoline_models:
         return jsonify({'error': 'Models are not loaded on the server.'}), 500
 
     data = request.get_json()
     print("Received prediction request:", data)
 
     fuel_type = data.get('fuelType')
+    model_tier = data.get('modelTier') or DEFAULT_MODEL_TIER
     recipe = data.get('recipe', [])
     if not recipe:
         return jsonify({'error': 'Recipe cannot be empty.'}), 400
@@ -160,14 +257,17 @@ def predict():
 
     try:
         if fuel_type == 'gasoline':
-            model, preprocessor_dict = gasoline_model, gasoline_preprocessor
+            models, preprocessor_dict = gasoline_models, gasoline_preprocessor
             target_names = ['RON', 'MON', 'AKI', 'LHV', 'Density', 'O2_wt_percent', 'Oxidative_Stability', 'Gum_Content', 'Acidity']
         elif fuel_type == 'diesel':
-            model, preprocessor_dict = diesel_model, diesel_preprocessor
+            models, preprocessor_dict = diesel_models, diesel_preprocessor
             target_names = ['CN', 'LHV', 'Density', 'O2_wt_percent', 'Oxidative_Stability', 'Gum_Content', 'Acidity']
         else:
             return jsonify({'error': 'Invalid fuel type specified.'}), 400
 
+        if model_tier not in models:
+            return jsonify({'error': f"Model tier '{model_tier}' is not loaded on the server."}), 400
+
         num_preprocessor = preprocessor_dict['numerical']
         cat_preprocessor = preprocessor_dict['categorical']
         numerical_features = input_df.select_dtypes(include=['number']).columns
@@ -177,7 +277,7 @@ def predict():
         input_cat_processed_sparse = cat_preprocessor.transform(input_df[categorical_features])
         input_processed_sparse = hstack([input_num_processed, input_cat_processed_sparse]).tocsr()
         
-        prediction = model.predict(input_processed_sparse)[0]
+        prediction = models[model_tier]['predict'](input_processed_sparse)[0]
         results = {name: round(float(value), 2) for name, value in zip(target_names, prediction)}
 
         total_pct = sum(c['percentage'] for c in recipe)
@@ -224,6 +324,7 @@ def predict():
         results['ai_insight'] = insight_text
         results['component_details'] = component_details
         results['id'] = f"blend_{int(time.time() * 1000)}"
+        results['model_tier'] = model_tier
         results['recipe'] = recipe
 
         return jsonify(results)
@@ -0,0 +1,197 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+# --- Configuration ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, '.pipeline_cache')
+OBJECTS_DIR = os.path.join(CACHE_DIR, 'objects')
+MANIFESTS_DIR = os.path.join(CACHE_DIR, 'stages')
+
+# --- Pipeline Definition ---
+# Each stage lists the files it reads and the files it writes, relative to BASE_DIR.
+# 'optional_outputs' are cached when the stage produces them (e.g. the compact model tiers,
+# which depend on BUILD_COMPACT_TIERS and QUANTIZATION_MODES).
+# A stage's fingerprint covers its script source, its config constants (which include
+# the RNG seeds) and the content hashes of its inputs, so editing NUM_ROWS_TO_GENERATE,
+# PROPERTY_BOUNDS, EPOCHS etc. or regenerating an upstream file invalidates it.
+STAGES = [
+    {
+        'name': 'components',
+        'script': '1_generate_component_database.py',
+        'inputs': [],
+        'outputs': ['pure_components_synthetic_data_v4.csv'],
+    },
+    {
+        'name': 'blends',
+        'script': '2_generate_training_blends.py',
+        'inputs': ['pure_components_synthetic_data_v4.csv'],
+        'outputs': ['fuel_blends_training_data_v3.csv'],
+    },
+    {
+        'name': 'models',
+        'script': '3_train_ai_models.py',
+        'inputs': ['fuel_blends_training_data_v3.csv'],
+        'outputs': [
+            'models/gasoline_model.keras', 'models/gasoline_preprocessor.joblib',
+            'models/diesel_model.keras', 'models/diesel_preprocessor.joblib',
+        ],
+        'optional_outputs': [
+            f'models/{fuel}_{suffix}' for fuel in ('gasoline', 'diesel')
+            for suffix in ('tiers.json', 'student.keras', 'student_float16.tflite', 'student_int8.tflite')
+        ],
+    },
+]
+
+# --- Helper Functions ---
+def hash_file(path, chunk_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def extract_config_constants(script_path):
+    """Collects the top-level UPPER_CASE literal assignments of a script (its config block)."""
+    with open(script_path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=script_path)
+
+    constants = {}
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Name) and target.id.isupper():
+                try:
+                    constants[target.id] = ast.literal_eval(node.value)
+                except ValueError:
+                    # Not a plain literal (e.g. a computed path); the source hash still covers it.
+                    continue
+    return constants
+
+def stage_fingerprint(stage):
+    """Builds the fingerprint for a stage from its script, config constants and input hashes."""
+    script_path = os.path.join(BASE_DIR, stage['script'])
+    inputs = {}
+    for rel_path in stage['inputs']:
+        path = os.path.join(BASE_DIR, rel_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Stage '{stage['name']}' is missing its input '{rel_path}'.")
+        inputs[rel_path] = hash_file(path)
+
+    payload = {
+        'script': stage['script'],
+        'script_hash': hash_file(script_path),
+        'config': extract_config_constants(script_path),
+        'inputs': inputs,
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=repr).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest(), payload
+
+def manifest_path(stage, fingerprint):
+    return os.path.join(MANIFESTS_DIR, stage['name'], f'{fingerprint}.json')
+
+def store_object(path):
+    """Copies a file into the content-addressed store and returns its hash."""
+    content_hash = hash_file(path)
+    object_path = os.path.join(OBJECTS_DIR, content_hash)
+    if not os.path.exists(object_path):
+        tmp_path = f'{object_path}.tmp'
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, object_path)
+    return content_hash
+
+def restore_object(content_hash, path):
+    """Materializes a cached object at 'path', skipping the copy if it is already up to date."""
+    if os.path.exists(path) and hash_file(path) == content_hash:
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    shutil.copyfile(os.path.join(OBJECTS_DIR, content_hash), path)
+
+def load_manifest(stage, fingerprint):
+    """Returns the cached manifest for a fingerprint, or None if any of its objects are gone."""
+    path = manifest_path(stage, fingerprint)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if not all(os.path.exists(os.path.join(OBJECTS_DIR, h)) for h in manifest['outputs'].values()):
+        return None
+    return manifest
+
+def run_stage(stage, fingerprint, payload, force=False):
+    """Executes a stage's script and records its outputs in the cache."""
+    start_time = time.time()
+    env = dict(os.environ)
+    if force:
+        # Stages keep their own internal caches (e.g. preprocessed matrices); bypass those too.
+        env['FUELAI_IGNORE_PREPROCESS_CACHE'] = '1'
+    result = subprocess.run([sys.executable, stage['script']], cwd=BASE_DIR, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"Stage '{stage['name']}' failed with exit code {result.returncode}.")
+
+    outputs = {}
+    for rel_path in stage['outputs']:
+        path = os.path.join(BASE_DIR, rel_path)
+        if not os.path.exists(path):
+            raise RuntimeError(f"Stage '{stage['name']}' did not produce '{rel_path}'.")
+        outputs[rel_path] = store_object(path)
+    for rel_path in stage.get('optional_outputs', []):
+        path = os.path.join(BASE_DIR, rel_path)
+        if os.path.exists(path):
+            outputs[rel_path] = store_object(path)
+
+    manifest = {
+        'stage': stage['name'],
+        'fingerprint': fingerprint,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'duration_seconds': round(time.time() - start_time, 2),
+        'inputs': payload['inputs'],
+        'outputs': outputs,
+    }
+    path = manifest_path(stage, fingerprint)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def run_pipeline(force=False):
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    for stage in STAGES:
+        print(f"\n{'='*20} STAGE: {stage['name'].upper()} ({stage['script']}) {'='*20}")
+        fingerprint, payload = stage_fingerprint(stage)
+        manifest = None if force else load_manifest(stage, fingerprint)
+
+        if manifest is not None:
+            for rel_path, content_hash in manifest['outputs'].items():
+                restore_object(content_hash, os.path.join(BASE_DIR, rel_path))
+            # Optional outputs this run did not produce must not linger from another run.
+            for rel_path in stage.get('optional_outputs', []):
+                path = os.path.join(BASE_DIR, rel_path)
+                if rel_path not in manifest['outputs'] and os.path.exists(path):
+                    os.remove(path)
+            print(f"Cache hit ({fingerprint[:12]}). Restored {len(manifest['outputs'])} output(s), "
+                  f"saving ~{manifest['duration_seconds']:.2f} seconds.")
+            continue
+
+        print(f"Cache miss ({fingerprint[:12]}). Running stage...")
+        manifest = run_stage(stage, fingerprint, payload, force=force)
+        print(f"Stage finished in {manifest['duration_seconds']:.2f} seconds; outputs cached.")
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Fuel-Forge data/training pipeline with stage caching.")
+    parser.add_argument('--force', action='store_true', help="Re-run every stage, ignoring cached outputs.")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    run_pipeline(force=args.force)
+    end_time = time.time()
+    print(f"\nTotal pipeline time: {end_time - start_time:.2f} seconds.")